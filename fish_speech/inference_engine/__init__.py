@@ -1,13 +1,18 @@
 import gc
 import queue
-from typing import Generator
+import threading
+from typing import Generator, Optional
 
 import numpy as np
 import torch
 from loguru import logger
 
 from fish_speech.inference_engine.reference_loader import ReferenceLoader
-from fish_speech.inference_engine.utils import InferenceResult, wav_chunk_header
+from fish_speech.inference_engine.utils import (
+    InferenceResult,
+    get_decoder_lock,
+    wav_chunk_header,
+)
 from fish_speech.inference_engine.vq_manager import VQManager
 from fish_speech.models.dac.modded_dac import DAC
 from fish_speech.models.text2semantic.inference import (
@@ -36,13 +41,25 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
         self.precision = precision
         self.compile = compile
 
+        # The LLAMA model is already serialized by its worker queue, but the
+        # decoder runs on the caller's thread. Requests served concurrently
+        # (API handlers, async task pool, VQGAN endpoints) take turns on it.
+        self.decoder_lock = get_decoder_lock(decoder_model)
+
     @torch.inference_mode()
-    def inference(self, req: ServeTTSRequest) -> Generator[InferenceResult, None, None]:
+    def inference(
+        self,
+        req: ServeTTSRequest,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Generator[InferenceResult, None, None]:
         """
         Main inference function:
         - Loads the reference audio and text.
         - Calls the LLAMA model for inference.
         - Decodes the VQ tokens to audio.
+
+        If `cancel_event` is given, the LLAMA model stops between decoding
+        steps once it is set, and no further segments are decoded.
         """
 
         ref_id: str | None = req.reference_id
@@ -62,7 +79,9 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
             logger.warning(f"set seed: {req.seed}")
 
         # Get the symbolic tokens from the LLAMA model
-        response_queue = self.send_Llama_request(req, prompt_tokens, prompt_texts)
+        response_queue = self.send_Llama_request(
+            req, prompt_tokens, prompt_texts, cancel_event
+        )
 
         # Get the sample rate from the decoder model
         if hasattr(self.decoder_model, "spec_transform"):
@@ -106,6 +125,12 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
                 )
 
             result: GenerateResponse = wrapped_result.response
+            if cancel_event is not None and cancel_event.is_set():
+                # Keep draining until the LLAMA model acknowledges the cancel
+                if result.action == "next":
+                    break
+                continue
+
             if result.action != "next":
                 segment = self.get_audio_segment(result)
 
@@ -166,7 +191,11 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
         return None
 
     def send_Llama_request(
-        self, req: ServeTTSRequest, prompt_tokens: list, prompt_texts: list
+        self,
+        req: ServeTTSRequest,
+        prompt_tokens: list,
+        prompt_texts: list,
+        cancel_event: Optional[threading.Event] = None,
     ) -> queue.Queue:
         """
         Send a request to the LLAMA model to generate the symbolic tokens.
@@ -195,6 +224,7 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
             GenerateRequest(
                 request=request,
                 response_queue=response_queue,
+                cancel_event=cancel_event,
             )
         )
 
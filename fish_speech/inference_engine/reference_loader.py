@@ -1,7 +1,10 @@
 import io
+import os
+import re
+import shutil
 from hashlib import sha256
 from pathlib import Path
-from typing import Callable, Literal, Tuple
+from typing import BinaryIO, Callable, Literal, Tuple
 
 import torch
 import torchaudio
@@ -16,6 +19,9 @@ from fish_speech.utils.file import (
 )
 from fish_speech.utils.schema import ServeReferenceAudio
 
+# Valid reference IDs: 1-255 alphanumerics, hyphens, underscores and spaces
+REFERENCE_ID_RE = re.compile(r"^[a-zA-Z0-9\-_ ]{1,255}\Z")
+
 
 class ReferenceLoader:
     def __init__(self) -> None:
@@ -178,23 +184,7 @@ class ReferenceLoader:
             FileNotFoundError: If the audio file doesn't exist
             OSError: If file operations fail
         """
-        # Validate ID format
-        import re
-
-        if not re.match(r"^[a-zA-Z0-9\-_ ]+$", id):
-            raise ValueError(
-                "Reference ID contains invalid characters. Only alphanumeric, hyphens, underscores, and spaces are allowed."
-            )
-
-        if len(id) > 255:
-            raise ValueError(
-                "Reference ID is too long. Maximum length is 255 characters."
-            )
-
-        # Check if reference already exists
-        ref_dir = Path("references") / id
-        if ref_dir.exists():
-            raise FileExistsError(f"Reference ID '{id}' already exists")
+        ref_dir = self._new_reference_dir(id)
 
         # Check if audio file exists
         audio_path = Path(wav_file_path)
@@ -215,8 +205,6 @@ class ReferenceLoader:
             target_audio_path = ref_dir / f"sample{audio_path.suffix}"
 
             # Copy audio file
-            import shutil
-
             shutil.copy2(audio_path, target_audio_path)
 
             # Create .lab file
@@ -233,11 +221,88 @@ class ReferenceLoader:
         except Exception as e:
             # Clean up on failure
             if ref_dir.exists():
-                import shutil
+                shutil.rmtree(ref_dir)
+            raise e
+
+    def add_reference_from_file(
+        self, id: str, audio_file: BinaryIO, reference_text: str
+    ) -> None:
+        """
+        Add a new reference voice by streaming an audio file object straight
+        into its reference directory, without an intermediate copy on disk.
+
+        Args:
+            id: Reference ID (directory name)
+            audio_file: Readable binary file object with the audio data
+            reference_text: Text content for the .lab file
+
+        Raises:
+            FileExistsError: If the reference ID already exists
+            ValueError: If the ID is invalid or the audio is empty
+            OSError: If file operations fail
+        """
+        ref_dir = self._new_reference_dir(id)
+
+        try:
+            # Create reference directory
+            ref_dir.mkdir(parents=True, exist_ok=False)
+
+            # Write under a non-audio suffix first, so a partial upload is
+            # never listed as a valid reference
+            target_audio_path = ref_dir / "sample.wav"
+            part_path = ref_dir / "sample.wav.part"
+            with open(part_path, "wb") as f:
+                shutil.copyfileobj(audio_file, f, length=1 << 20)
+                audio_size = f.tell()
 
+            if audio_size == 0:
+                raise ValueError("Audio file is empty or could not be read")
+
+            os.replace(part_path, target_audio_path)
+
+            # Create .lab file
+            lab_path = ref_dir / "sample.lab"
+            with open(lab_path, "w", encoding="utf-8") as f:
+                f.write(reference_text)
+
+            # Clear cache for this ID if it exists
+            if id in self.ref_by_id:
+                del self.ref_by_id[id]
+
+            logger.info(f"Successfully added reference voice with ID: {id}")
+
+        except FileExistsError:
+            # Another request created the directory first, it is not ours
+            raise
+        except Exception as e:
+            # Clean up on failure
+            if ref_dir.exists():
                 shutil.rmtree(ref_dir)
             raise e
 
+    def _new_reference_dir(self, id: str) -> Path:
+        """
+        Validate a new reference ID and return its (not yet created) directory.
+        """
+        # Validate ID length first, the format pattern also bounds it
+        if len(id) > 255:
+            raise ValueError(
+                "Reference ID is too long. Maximum length is 255 characters."
+            )
+
+        # Validate ID format
+        if not REFERENCE_ID_RE.match(id):
+            raise ValueError(
+                "Reference ID contains invalid characters. Only alphanumeric, hyphens, underscores, and spaces are allowed."
+            )
+
+        # Check if reference already exists
+        ref_dir = Path("references") / id
+        if ref_dir.exists():
+            raise FileExistsError(f"Reference ID '{id}' already exists")
+
+        return ref_dir
+
     def delete_reference(self, id: str) -> None:
         """
         Delete a reference voice by removing its directory and files.
@@ -256,8 +321,6 @@ class ReferenceLoader:
 
         try:
             # Remove the entire reference directory
-            import shutil
-
             shutil.rmtree(ref_dir)
 
             # Clear cache for this ID if it exists
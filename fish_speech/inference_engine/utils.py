@@ -1,4 +1,6 @@
 import io
+import struct
+import threading
 import wave
 from dataclasses import dataclass
 from typing import Literal, Optional, Tuple
@@ -13,6 +15,27 @@ class InferenceResult:
     error: Optional[Exception]
 
 
+_decoder_lock_guard = threading.Lock()
+
+
+def get_decoder_lock(model) -> threading.Lock:
+    """
+    Return the lock serializing encode/decode calls on a shared decoder model.
+
+    The lock is stored on the model, so every caller holding the same model
+    (the inference engine, the VQGAN endpoints) takes turns on it.
+    """
+    lock = getattr(model, "_decoder_lock", None)
+    if lock is None:
+        with _decoder_lock_guard:
+            lock = getattr(model, "_decoder_lock", None)
+            if lock is None:
+                lock = threading.Lock()
+                model._decoder_lock = lock
+
+    return lock
+
+
 def wav_chunk_header(
     sample_rate: int = 44100, bit_depth: int = 16, channels: int = 1
 ) -> bytes:
@@ -27,3 +50,27 @@ def wav_chunk_header(
     buffer.close()
 
     return wav_header_bytes
+
+
+def wav_header(
+    sample_rate: int, num_frames: int, bit_depth: int = 16, channels: int = 1
+) -> bytes:
+    block_align = channels * bit_depth // 8
+    data_size = num_frames * block_align
+
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        channels,
+        sample_rate,
+        sample_rate * block_align,
+        block_align,
+        bit_depth,
+        b"data",
+        data_size,
+    )
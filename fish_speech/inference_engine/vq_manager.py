@@ -1,3 +1,4 @@
+import threading
 from typing import Callable
 
 import torch
@@ -11,6 +12,7 @@ class VQManager:
     def __init__(self):
         # Make Pylance happy (attribut/method not defined...)
         self.decoder_model: DAC
+        self.decoder_lock: threading.Lock
         self.load_audio: Callable
 
     def decode_vq_tokens(self, codes):
@@ -20,10 +22,11 @@ class VQManager:
         logger.info(f"VQ features: {codes.shape}")
 
         if isinstance(self.decoder_model, DAC):
-            return self.decoder_model.decode(
-                indices=codes[None],
-                feature_lengths=feature_lengths,
-            )[0].squeeze()
+            with self.decoder_lock:
+                return self.decoder_model.decode(
+                    indices=codes[None],
+                    feature_lengths=feature_lengths,
+                )[0].squeeze()
 
         raise ValueError(f"Unknown model type: {type(self.decoder_model)}")
 
@@ -48,7 +51,9 @@ class VQManager:
 
             # VQ Encoder
             if isinstance(self.decoder_model, DAC):
-                prompt_tokens = self.decoder_model.encode(audios, audio_lengths)[0][0]
+                with self.decoder_lock:
+                    encoded = self.decoder_model.encode(audios, audio_lengths)
+                prompt_tokens = encoded[0][0]
                 logger.info(f"Encoded prompt: {prompt_tokens.shape}")
             else:
                 raise ValueError(f"Unknown model type: {type(self.decoder_model)}")
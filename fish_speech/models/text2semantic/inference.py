@@ -185,6 +185,7 @@ def decode_n_tokens(
     audio_masks: torch.Tensor,
     audio_parts: torch.Tensor,
     decode_one_token=decode_one_token_ar,
+    cancel_event: Optional[threading.Event] = None,
 ):
     previous_tokens = torch.zeros(
         (model.config.num_codebooks + 1, model.config.max_seq_len),
@@ -193,6 +194,10 @@ def decode_n_tokens(
     )
 
     for i in tqdm(range(num_new_tokens)):
+        # Stop between steps if the caller cancelled the request
+        if cancel_event is not None and cancel_event.is_set():
+            break
+
         # We need to get windowed repeat penalty
         win_size = 16
         if i < win_size:
@@ -241,6 +246,7 @@ def generate(
     audio_parts: torch.Tensor,
     decode_one_token=decode_one_token_ar,
     num_samples: int = 1,
+    cancel_event: Optional[threading.Event] = None,
     **sampling_kwargs,
 ):
     """
@@ -340,6 +346,7 @@ def generate(
         audio_masks=audio_masks,
         audio_parts=audio_parts,
         decode_one_token=decode_one_token,
+        cancel_event=cancel_event,
     )
     seq = seq[:, : T + 1 + x.size(1)]
     seq[:, T + 1 :] = x
@@ -406,6 +413,7 @@ def generate_long(
     chunk_length: int = 512,
     prompt_text: Optional[Union[str, list[str]]] = None,
     prompt_tokens: Optional[Union[torch.Tensor, list[torch.Tensor]]] = None,
+    cancel_event: Optional[threading.Event] = None,
 ):
     assert 0 < top_p <= 1, "top_p must be in (0, 1]"
     assert 0 < repetition_penalty < 2, "repetition_penalty must be in (0, 2)"
@@ -555,8 +563,15 @@ def generate_long(
                 temperature=temperature,
                 top_p=top_p,
                 repetition_penalty=repetition_penalty,
+                cancel_event=cancel_event,
             )
 
+            # Drop the partial chunk and finish early if the request was cancelled
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Generation cancelled, stopping early")
+                yield GenerateResponse(action="next")
+                return
+
             if sample_idx == 0 and seg_idx == 0 and compile:
                 logger.info(f"Compilation time: {time.perf_counter() - t0:.2f} seconds")
 
@@ -600,6 +615,7 @@ class WrappedGenerateResponse:
 class GenerateRequest:
     request: dict
     response_queue: queue.Queue
+    cancel_event: Optional[threading.Event] = None
 
 
 def launch_thread_safe_queue(
@@ -633,7 +649,10 @@ def launch_thread_safe_queue(
 
             try:
                 for chunk in generate_long(
-                    model=model, decode_one_token=decode_one_token, **kwargs
+                    model=model,
+                    decode_one_token=decode_one_token,
+                    cancel_event=item.cancel_event,
+                    **kwargs,
                 ):
                     response_queue.put(
                         WrappedGenerateResponse(status="success", response=chunk)
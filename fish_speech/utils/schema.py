@@ -45,11 +45,19 @@ class ServeVQGANEncodeRequest(BaseModel):
 
 
 class ServeVQGANEncodeResponse(BaseModel):
-    tokens: SkipValidation[list[list[list[int]]]]
+    # Raw little-endian token buffers, one per audio
+    # Restore with np.frombuffer(tokens[i], dtype=dtype).reshape(shapes[i])
+    tokens: list[bytes]
+    shapes: list[list[int]]
+    dtype: str = "int16"
 
 
 class ServeVQGANDecodeRequest(BaseModel):
-    tokens: SkipValidation[list[list[list[int]]]]
+    # Either nested int lists, or raw buffers in the encode response layout
+    # (shapes and dtype are required to restore the latter)
+    tokens: SkipValidation[list[list[list[int]]] | list[bytes]]
+    shapes: list[list[int]] | None = None
+    dtype: Literal["int16", "int32", "int64"] = "int16"
 
 
 class ServeVQGANDecodeResponse(BaseModel):
@@ -23,8 +23,8 @@ pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
 from tools.server.api_utils import MsgPackRequest, parse_args
 from tools.server.exception_handler import ExceptionHandler
 from tools.server.model_manager import ModelManager
-from tools.server.task_manager import TaskManager
-from tools.server.views import routes
+from tools.server.task_manager import TaskManager, apply_inference_cpu_settings
+from tools.server.views import model_manager_var, routes, task_manager_var
 
 
 class API(ExceptionHandler):
@@ -45,9 +45,18 @@ class API(ExceptionHandler):
             else:
                 return passthrough
 
+        def bind_managers(endpoint):
+            async def wrapper():
+                model_manager_var.set(self.model_manager)
+                task_manager_var.set(self.task_manager)
+                return await endpoint()
+
+            return wrapper
+
         self.routes = Routes(
             routes,  # keep existing routes
-            http_middlewares=[api_auth],  # apply api_auth middleware
+            # apply api_auth and bind the managers for the views
+            http_middlewares=[api_auth, bind_managers],
         )
 
         # OpenAPI documentation disabled
@@ -78,10 +87,15 @@ class API(ExceptionHandler):
 
         # Associate the app with the model manager
         self.app.on_startup(self.initialize_app)
+        self.app.on_shutdown(self.shutdown_app)
 
     async def initialize_app(self, app: Kui):
+        # Pin torch threads and CPUs before any model thread is started, so the
+        # LLAMA worker and every pool created later inherit the affinity
+        apply_inference_cpu_settings()
+
         # Make the ModelManager available to the views
-        app.state.model_manager = ModelManager(
+        self.model_manager = app.state.model_manager = ModelManager(
             mode=self.args.mode,
             device=self.args.device,
             half=self.args.half,
@@ -89,13 +103,22 @@ class API(ExceptionHandler):
             llama_checkpoint_path=self.args.llama_checkpoint_path,
             decoder_checkpoint_path=self.args.decoder_checkpoint_path,
             decoder_config_name=self.args.decoder_config_name,
+            compile_decoder=self.args.compile_decoder,
         )
 
         # Initialize TaskManager for async tasks
-        app.state.task_manager = TaskManager()
+        self.task_manager = app.state.task_manager = TaskManager(
+            max_concurrent_infer=self.args.max_concurrent_infer,
+            result_cache_size=self.args.result_cache_size,
+        )
+        self.task_manager.start_cleanup()
 
         logger.info(f"Startup done, listening server at http://{self.args.listen}")
 
+    async def shutdown_app(self, app: Kui):
+        # Drain the async tasks before the process exits
+        await app.state.task_manager.shutdown()
+
 
 # Each worker process created by Uvicorn has its own memory space,
 # meaning that models and variables are not shared between processes.
@@ -1,7 +1,9 @@
+import struct
 from argparse import ArgumentParser
 from http import HTTPStatus
 from typing import Annotated, Any
 
+import numpy as np
 import ormsgpack
 from baize.datastructures import ContentType
 from kui.asgi import (
@@ -12,8 +14,10 @@ from kui.asgi import (
 )
 from loguru import logger
 from pydantic import BaseModel
+from pydantic_core import to_json
 
 from fish_speech.inference_engine import TTSInferenceEngine
+from fish_speech.inference_engine.utils import wav_header
 from fish_speech.utils.schema import ServeTTSRequest
 from tools.server.inference import inference_wrapper as inference
 
@@ -35,9 +39,12 @@ def parse_args():
     parser.add_argument("--device", type=str, default="cuda")
     parser.add_argument("--half", action="store_true")
     parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--compile-decoder", action="store_true")
     parser.add_argument("--max-text-length", type=int, default=0)
     parser.add_argument("--listen", type=str, default="127.0.0.1:8080")
     parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-concurrent-infer", type=int, default=1)
+    parser.add_argument("--result-cache-size", type=int, default=128)
     parser.add_argument("--api-key", type=str, default=None)
 
     return parser.parse_args()
@@ -76,8 +83,64 @@ async def inference_async(req: ServeTTSRequest, engine: TTSInferenceEngine):
             yield chunk
 
 
-async def buffer_to_async_generator(buffer):
-    yield buffer
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+async def buffer_to_async_generator(buffer, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield a bytes-like buffer in fixed-size chunks so sending overlaps receiving."""
+    if isinstance(buffer, bytes) and len(buffer) <= chunk_size:
+        yield buffer
+        return
+
+    data = memoryview(buffer).cast("B")
+    for i in range(0, len(data), chunk_size):
+        yield bytes(data[i : i + chunk_size])
+
+
+async def wav_to_async_generator(
+    pcm: np.ndarray, sample_rate: int, chunk_size: int = STREAM_CHUNK_SIZE
+):
+    """Yield mono int16 PCM as a WAV file, header first, then fixed-size chunks."""
+    yield wav_header(sample_rate, len(pcm))
+
+    async for chunk in buffer_to_async_generator(np.ascontiguousarray(pcm), chunk_size):
+        yield chunk
+
+
+def packb_bin_list(key: str, buffers: list) -> bytes:
+    """
+    Pack ``{key: [bin, ...]}`` as msgpack straight from buffer-protocol objects.
+
+    The payloads are copied exactly once, into the returned body, instead of
+    first into per-item ``bytes`` and then again by ``ormsgpack.packb``.
+    """
+    key_bytes = key.encode("utf-8")
+    if len(key_bytes) < 32:
+        head = [bytes((0x81, 0xA0 | len(key_bytes))), key_bytes]
+    else:
+        head = [bytes((0x81, 0xD9, len(key_bytes))), key_bytes]
+
+    n = len(buffers)
+    if n < 16:
+        head.append(bytes((0x90 | n,)))
+    elif n < 1 << 16:
+        head.append(struct.pack(">BH", 0xDC, n))
+    else:
+        head.append(struct.pack(">BI", 0xDD, n))
+
+    parts = head
+    for buffer in buffers:
+        view = memoryview(buffer).cast("B")
+        size = len(view)
+        if size < 1 << 8:
+            parts.append(struct.pack(">BB", 0xC4, size))
+        elif size < 1 << 16:
+            parts.append(struct.pack(">BH", 0xC5, size))
+        else:
+            parts.append(struct.pack(">BI", 0xC6, size))
+        parts.append(view)
+
+    return b"".join(parts)
 
 
 def get_content_type(audio_format):
@@ -111,14 +174,14 @@ def wants_json(req):
     return "application/json" in accept and "application/msgpack" not in accept
 
 
-def format_response(response: BaseModel, status_code=200):
+def format_response(response: BaseModel | dict, status_code=200):
     """
     Helper function to format responses consistently based on client preference.
 
     Parameters
     ----------
-    response : BaseModel
-        The response object to format
+    response : BaseModel | dict
+        The response object to format, or a plain dict with the same fields
     status_code : int
         HTTP status code (default: 200)
 
@@ -129,8 +192,12 @@ def format_response(response: BaseModel, status_code=200):
     """
     try:
         if wants_json(request):
-            return JSONResponse(
-                response.model_dump(mode="json"), status_code=status_code
+            # pydantic-core serializes models and dicts straight to JSON bytes,
+            # without the model_dump() dict and json.dumps round trip
+            return (
+                to_json(response),
+                status_code,
+                {"Content-Type": "application/json"},
             )
 
         return (
@@ -1,4 +1,6 @@
+import threading
 from http import HTTPStatus
+from typing import Optional
 
 import numpy as np
 from kui.asgi import HTTPException
@@ -9,6 +11,13 @@ from fish_speech.utils.schema import ServeTTSRequest
 AMPLITUDE = 32768  # Needs an explaination
 
 
+def audio_to_int16(audio: np.ndarray) -> np.ndarray:
+    """
+    Quantize float audio in [-1, 1] to 16-bit PCM samples.
+    """
+    return np.clip(audio * 32767.0, -32768, 32767).astype(np.int16)
+
+
 def inference_wrapper(req: ServeTTSRequest, engine: TTSInferenceEngine):
     """
     Wrapper for the inference function.
@@ -43,3 +52,33 @@ def inference_wrapper(req: ServeTTSRequest, engine: TTSInferenceEngine):
             HTTPStatus.INTERNAL_SERVER_ERROR,
             content="No audio generated, please check the input text.",
         )
+
+
+def inference_final(
+    req: ServeTTSRequest,
+    engine: TTSInferenceEngine,
+    cancel_event: Optional[threading.Event] = None,
+) -> np.ndarray:
+    """
+    Run inference and return only the final concatenated audio.
+    Used for non-streaming requests: header and segment results are skipped
+    without being encoded to bytes.
+    `cancel_event` is forwarded to the engine so generation can stop early.
+    """
+    for result in engine.inference(req, cancel_event=cancel_event):
+        match result.code:
+            case "error":
+                raise HTTPException(
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                    content=str(result.error),
+                )
+
+            case "final":
+                if isinstance(result.audio, tuple):
+                    return result.audio[1]
+                break
+
+    raise HTTPException(
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+        content="No audio generated, please check the input text.",
+    )
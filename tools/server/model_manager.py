@@ -18,12 +18,14 @@ class ModelManager:
         llama_checkpoint_path: str,
         decoder_checkpoint_path: str,
         decoder_config_name: str,
+        compile_decoder: bool = False,
     ) -> None:
 
         self.mode = mode
         self.device = device
         self.half = half
         self.compile = compile
+        self.compile_decoder = compile_decoder
 
         self.precision = torch.half if half else torch.bfloat16
 
@@ -77,6 +79,14 @@ class ModelManager:
         )
         logger.info("Decoder model loaded.")
 
+        if self.compile_decoder:
+            # Segment lengths vary per request, so compile with dynamic shapes
+            # rather than CUDA graphs, which would re-record for every length
+            logger.info("Compiling decoder...")
+            self.decoder_model.decode = torch.compile(
+                self.decoder_model.decode, dynamic=True
+            )
+
     def warm_up(self, tts_inference_engine) -> None:
         request = ServeTTSRequest(
             text="Hello world.",
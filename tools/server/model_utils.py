@@ -1,3 +1,4 @@
+import hashlib
 import io
 import re
 
@@ -6,11 +7,45 @@ import torch
 import torchaudio
 from cachetools import LRUCache, cached
 
+from fish_speech.inference_engine.utils import get_decoder_lock
+
 CACHE_MAXSIZE = 10000
 MICRO_BATCH_SIZE = 8
 ASR_SAMPLE_RATE = 16000
 HUGE_GAP_THRESHOLD = 4000
 
+# Pinned host buffers reused for decode D2H copies, one per dtype, grown on demand
+_pinned_staging: dict[torch.dtype, torch.Tensor] = {}
+
+
+def get_pinned_staging(shape, dtype: torch.dtype) -> torch.Tensor:
+    numel = 1
+    for size in shape:
+        numel *= size
+
+    buffer = _pinned_staging.get(dtype)
+    if buffer is None or buffer.numel() < numel:
+        buffer = _pinned_staging[dtype] = torch.empty(
+            numel, dtype=dtype, pin_memory=True
+        )
+
+    return buffer[:numel].view(shape)
+
+
+def pad_stack(tensors: list[torch.Tensor], max_length: int, device) -> torch.Tensor:
+    # Zero-pad along the last dim into one preallocated batch on the target
+    # device, instead of a padded copy per item followed by torch.stack
+    first = tensors[0]
+    padded = torch.zeros(
+        (len(tensors), *first.shape[:-1], max_length),
+        dtype=first.dtype,
+        device=device,
+    )
+    for i, tensor in enumerate(tensors):
+        padded[i, ..., : tensor.shape[-1]] = tensor
+
+    return padded
+
 
 @torch.no_grad()
 @torch.autocast(device_type="cuda", dtype=torch.half)
@@ -35,22 +70,27 @@ def batch_encode(model, audios_list: list[bytes]):
 
     print(f"Encode max length: {max_length / sample_rate:.2f}s")
 
-    padded = torch.stack(
-        [
-            torch.nn.functional.pad(audio, (0, int(max_length - audio.shape[-1])))
-            for audio in audios
-        ]
-    ).to(model.device)
+    padded = pad_stack(audios, int(max_length), model.device)
 
-    features, feature_lengths = model.encode(padded, audio_lengths=lengths)
+    with get_decoder_lock(model):
+        features, feature_lengths = model.encode(padded, audio_lengths=lengths)
     features, feature_lengths = features.cpu(), feature_lengths.cpu()
 
     return [feature[..., :length] for feature, length in zip(features, feature_lengths)]
 
 
+def _audio_digest(audio: bytes) -> bytes:
+    # Key on a digest rather than the audio itself, so cache entries do not
+    # keep whole uploads alive and lookups hash each buffer exactly once
+    return hashlib.blake2b(memoryview(audio), digest_size=16).digest()
+
+
 @cached(
     cache=LRUCache(maxsize=CACHE_MAXSIZE),
-    key=lambda model, audios: (model.device, tuple(audios)),
+    key=lambda model, audios: (
+        model.device,
+        tuple(_audio_digest(audio) for audio in audios),
+    ),
 )
 def cached_vqgan_batch_encode(model, audios: list[bytes]):
     return batch_encode(model, audios)
@@ -58,29 +98,39 @@ def cached_vqgan_batch_encode(model, audios: list[bytes]):
 
 @torch.no_grad()
 @torch.autocast(device_type="cuda", dtype=torch.half)
-def batch_vqgan_decode(model, features):
+def batch_vqgan_decode(model, features, dtype=None, pinned=False):
+    # With pinned=True the returned arrays alias a shared staging buffer and
+    # are only valid until the next pinned call, so consume them right away
     lengths = torch.tensor(
         [feature.shape[-1] for feature in features], device=model.device
     )
     max_length = lengths.max().item()
-    padded = torch.stack(
-        [
-            torch.nn.functional.pad(feature, (0, max_length - feature.shape[-1]))
-            for feature in features
-        ]
-    ).to(model.device)
+    padded = pad_stack(features, max_length, model.device)
 
     # If bs too large, we do micro batch decode
     audios, audio_lengths = [], []
     for i in range(0, padded.shape[0], MICRO_BATCH_SIZE):
-        audio, audio_length = model.decode(
-            padded[i : i + MICRO_BATCH_SIZE],
-            feature_lengths=lengths[i : i + MICRO_BATCH_SIZE],
-        )
+        with get_decoder_lock(model):
+            audio, audio_length = model.decode(
+                padded[i : i + MICRO_BATCH_SIZE],
+                feature_lengths=lengths[i : i + MICRO_BATCH_SIZE],
+            )
         audios.append(audio)
         audio_lengths.append(audio_length)
     audios = torch.cat(audios, dim=0)
     audio_lengths = torch.cat(audio_lengths, dim=0)
-    audios, audio_lengths = audios.cpu(), audio_lengths.cpu()
+
+    # Cast on device so the device-to-host copy moves the narrow dtype
+    if dtype is not None:
+        audios = audios.to(dtype)
+
+    if pinned and audios.is_cuda:
+        host = get_pinned_staging(audios.shape, audios.dtype)
+        host.copy_(audios, non_blocking=True)
+        torch.cuda.current_stream(audios.device).synchronize()
+        audios = host
+    else:
+        audios = audios.cpu()
+    audio_lengths = audio_lengths.cpu()
 
     return [audio[..., :length].numpy() for audio, length in zip(audios, audio_lengths)]
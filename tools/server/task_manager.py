@@ -1,23 +1,30 @@
 import asyncio
-import io
+import hashlib
+import heapq
 import os
+import shutil
 import tempfile
 import threading
 import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Coroutine, Dict, Iterator, List, Optional, Set, Tuple
 
 import numpy as np
+import ormsgpack
 import pyrootutils
 import soundfile as sf
+import torch
 from loguru import logger
+from pydantic_core import to_json
 from pydub import AudioSegment
 
 from fish_speech.inference_engine import TTSInferenceEngine
 from fish_speech.utils.schema import ServeTTSRequest
-from tools.server.inference import inference_wrapper as inference
+from tools.server.inference import audio_to_int16, inference_final
 
 # 获取项目根目录
 try:
@@ -26,6 +33,54 @@ except Exception:
     # 如果找不到项目根目录，使用当前文件所在目录向上查找
     PROJECT_ROOT = Path(__file__).parent.parent.parent
 
+# 任务表分片数量（必须是2的幂），每个分片有独立的锁，减少全局锁竞争
+TASK_SHARDS = 16
+
+# 后台清理旧任务的间隔与最大保留时间（秒）
+CLEANUP_INTERVAL_SECONDS = 60
+TASK_MAX_AGE_SECONDS = 3600
+
+# 结果下载地址前缀
+DOWNLOAD_URL_PREFIX = "/download_result/"
+
+# 推理使用的CPU线程数（0表示使用torch默认值），以及进程绑定的CPU列表（如 "0-7,16"）
+NUM_INFERENCE_THREADS = int(os.getenv("NUM_INFERENCE_THREADS", 0))
+INFERENCE_CPUS = os.getenv("INFERENCE_CPUS", "")
+
+
+def parse_cpu_list(spec: str) -> Set[int]:
+    """解析 "0-3,8" 形式的CPU列表"""
+    cpus: Set[int] = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def apply_inference_cpu_settings() -> None:
+    """
+    按环境变量固定 torch 线程数，并将当前线程绑定到指定CPU
+
+    需在 ModelManager 启动 LLAMA 工作线程之前于主线程调用：新线程继承创建者的
+    CPU 绑定，之后启动的 LLAMA 生成线程、torch 线程池以及推理、编码线程池
+    都运行在指定的CPU上（绑定仅支持 sched_setaffinity 的平台）。
+    """
+    if NUM_INFERENCE_THREADS > 0:
+        torch.set_num_threads(NUM_INFERENCE_THREADS)
+
+    cpus = parse_cpu_list(INFERENCE_CPUS)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            logger.warning(f"Failed to pin inference threads to CPUs: {e}")
+
 
 class TaskStatus(str, Enum):
     """任务状态枚举"""
@@ -38,18 +93,54 @@ class TaskStatus(str, Enum):
 
 class AsyncTask:
     """异步任务类"""
+
+    __slots__ = (
+        "step_id",
+        "request",
+        "_status",
+        "status_value",
+        "created_at",
+        "started_at",
+        "completed_at",
+        "created_mono",
+        "started_mono",
+        "completed_mono",
+        "error_message",
+        "result_path",
+        "cancelled",
+        "future",
+        "inference",
+        "status_snapshot",
+    )
     
     def __init__(self, step_id: str, request: ServeTTSRequest):
         self.step_id = step_id
         self.request = request
         self.status = TaskStatus.PENDING
+        # *_at 为墙上时间，用于接口返回；*_mono 为单调时钟（纳秒），用于计算耗时
         self.created_at = time.time()
         self.started_at: Optional[float] = None
         self.completed_at: Optional[float] = None
+        self.created_mono = time.monotonic_ns()
+        self.started_mono: Optional[int] = None
+        self.completed_mono: Optional[int] = None
         self.error_message: Optional[str] = None
-        self.result_path: Optional[str] = None
+        self.result_path: Optional[Path] = None
         self.cancelled = threading.Event()
-        self.thread: Optional[threading.Thread] = None
+        self.future: Optional[asyncio.Task] = None
+        self.inference: Optional["SharedInference"] = None
+
+    @property
+    def status(self) -> TaskStatus:
+        return self._status
+
+    @status.setter
+    def status(self, status: TaskStatus) -> None:
+        # 状态变化时缓存字符串值，状态查询时无需再访问枚举属性；
+        # 同时作废预序列化的状态快照（因此其它字段须在状态之前赋值）
+        self._status = status
+        self.status_value: str = status.value
+        self.status_snapshot: Optional[Tuple[bytes, bytes]] = None
         
     def cancel(self):
         """取消任务"""
@@ -60,18 +151,69 @@ class AsyncTask:
             self.status = TaskStatus.CANCELLED
 
 
+class SharedInference:
+    """合并执行的推理：相同请求的多个任务共享一次推理结果"""
+
+    __slots__ = ("request", "tasks", "started", "cancelled", "future")
+
+    def __init__(self, request: ServeTTSRequest):
+        self.request = request
+        self.tasks: List[AsyncTask] = []
+        self.started = False
+        # 仅当所有合并的任务都取消时才置位
+        self.cancelled = threading.Event()
+        self.future: Optional[asyncio.Task] = None
+
+
 class TaskManager:
     """任务管理器，用于管理异步生成任务"""
     
-    def __init__(self, temp_dir: Optional[str] = None):
+    def __init__(
+        self,
+        temp_dir: Optional[str] = None,
+        max_concurrent_infer: int = 1,
+        result_cache_size: int = 128,
+    ):
         """
         初始化任务管理器
         
         Args:
             temp_dir: 临时目录路径，用于存储生成结果。如果为None，则使用项目目录下的临时文件夹
+            max_concurrent_infer: 同时执行推理的最大任务数，超出的任务保持等待状态
+            result_cache_size: 已完成结果的LRU缓存条目数，相同请求直接复用结果文件，0表示禁用
         """
-        self.tasks: Dict[str, AsyncTask] = {}
-        self.lock = threading.Lock()
+        # 按 step_id 哈希分片存储任务，每个分片独立加锁
+        self._shards: List[Dict[str, AsyncTask]] = [{} for _ in range(TASK_SHARDS)]
+        self._locks: List[threading.Lock] = [
+            threading.Lock() for _ in range(TASK_SHARDS)
+        ]
+
+        # 按创建时间排序的最小堆 (created_mono, step_id)，清理时只需弹出过期的部分
+        self._expiry_heap: List[Tuple[int, str]] = []
+        self._expiry_lock = threading.Lock()
+        self._gc_task: Optional[asyncio.Task] = None
+
+        # 推理并发上限：固定大小的线程池 + 信号量，排队中的任务不占用线程
+        self.max_concurrent_infer = max(1, max_concurrent_infer)
+
+        # 线程数与CPU绑定由 apply_inference_cpu_settings 在加载模型前统一设置
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_infer,
+            thread_name_prefix="tts-infer",
+        )
+        self._sem = asyncio.Semaphore(self.max_concurrent_infer)
+
+        # 音频编码（纯CPU）使用独立线程池，推理槽位拿到音频后立即释放
+        self._encode_executor = ThreadPoolExecutor(
+            max_workers=os.cpu_count() or 1,
+            thread_name_prefix="tts-encode",
+        )
+
+        # 进行中的推理，按推理键合并相同请求
+        self._inflight: Dict[bytes, SharedInference] = {}
+
+        # 所有未结束的后台协程，保持强引用，并在关闭时等待其完成
+        self._running: Set[asyncio.Task] = set()
         
         # 设置临时目录
         if temp_dir:
@@ -82,9 +224,34 @@ class TaskManager:
         
         # 确保临时目录存在
         self.temp_dir.mkdir(parents=True, exist_ok=True)
+
+        # 结果缓存：结果键 -> 缓存文件（与任务结果文件硬链接），按LRU淘汰
+        # 缓存目录只属于当前进程，启动时清空上次遗留的文件
+        self.result_cache_size = max(0, result_cache_size)
+        self._result_cache: "OrderedDict[bytes, Path]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        self._cache_dir = self.temp_dir / "cache"
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
         
-        logger.info(f"TaskManager initialized with temp_dir: {self.temp_dir}")
+        logger.info(
+            f"TaskManager initialized with temp_dir: {self.temp_dir}, "
+            f"max_concurrent_infer: {self.max_concurrent_infer}, "
+            f"num_threads: {torch.get_num_threads()}, "
+            f"result_cache_size: {self.result_cache_size}"
+        )
     
+    def _shard_index(self, step_id: str) -> int:
+        """获取 step_id 所在分片的下标"""
+        return hash(step_id) & (TASK_SHARDS - 1)
+
+    def _iter_tasks(self) -> Iterator[AsyncTask]:
+        """逐个分片遍历所有任务，每次只持有一个分片的锁"""
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                tasks = list(shard.values())
+            yield from tasks
+
     def create_task(self, step_id: str, request: ServeTTSRequest) -> AsyncTask:
         """
         创建新任务
@@ -96,133 +263,360 @@ class TaskManager:
         Returns:
             AsyncTask对象
         """
-        with self.lock:
+        index = self._shard_index(step_id)
+        shard = self._shards[index]
+        old_result_path: Optional[Path] = None
+        with self._locks[index]:
             # 如果任务已存在
-            if step_id in self.tasks:
-                old_task = self.tasks[step_id]
+            if step_id in shard:
+                old_task = shard[step_id]
                 # 如果旧任务还在运行或等待中，抛出错误
                 if old_task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
                     raise ValueError(f"Task with step_id {step_id} is running")
                 # 如果任务已结束（已完成、失败或已取消），则覆盖
-                # 清理旧任务的临时文件
-                if old_task.result_path and os.path.exists(old_task.result_path):
-                    try:
-                        os.unlink(old_task.result_path)
-                    except Exception as e:
-                        logger.warning(f"Failed to delete old task temp file: {e}")
-                logger.info(f"Overwriting completed task {step_id}")
+                old_result_path = old_task.result_path
+                logger.info("Overwriting completed task {}", step_id)
             
             task = AsyncTask(step_id, request)
-            self.tasks[step_id] = task
-            logger.info(f"Created task {step_id}")
-            return task
+            shard[step_id] = task
+
+        # 在锁外清理旧任务的临时文件
+        if old_result_path is not None:
+            try:
+                old_result_path.unlink(missing_ok=True)
+            except Exception as e:
+                logger.warning(f"Failed to delete old task temp file: {e}")
+
+        with self._expiry_lock:
+            heapq.heappush(self._expiry_heap, (task.created_mono, step_id))
+
+        logger.info("Created task {}", step_id)
+        return task
     
     def get_task(self, step_id: str) -> Optional[AsyncTask]:
         """获取任务"""
-        with self.lock:
-            return self.tasks.get(step_id)
+        # 单次 dict.get 在 CPython 中是原子的，读取无需加锁
+        return self._shards[self._shard_index(step_id)].get(step_id)
     
-    def start_task(
+    @staticmethod
+    def _reference_signature(reference_id: Optional[str]) -> bytes:
+        """
+        计算 references/<id>/ 下文件的签名（文件名、大小、修改时间）
+
+        参考音频被新增、删除、重命名或在磁盘上修改后签名随之变化，
+        旧的推理结果不会再被复用。目录不存在时返回空签名。
+        """
+        if reference_id is None:
+            return b""
+
+        try:
+            with os.scandir(Path("references") / reference_id) as it:
+                entries = sorted(
+                    (entry.name, entry.stat()) for entry in it if entry.is_file()
+                )
+        except OSError:
+            return b""
+
+        return "\0".join(
+            f"{name}:{st.st_size}:{st.st_mtime_ns}" for name, st in entries
+        ).encode()
+
+    def _inference_key(
+        self, request: ServeTTSRequest, reference_signature: bytes = b""
+    ) -> bytes:
+        """
+        计算推理请求的合并键
+
+        输出格式只影响编码阶段，不参与计算；参考音频按内容计入，
+        reference_id 按其目录下文件的签名计入。
+        """
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(
+            request.model_dump_json(
+                exclude={"format", "streaming", "references"}
+            ).encode()
+        )
+        for ref in request.references:
+            hasher.update(len(ref.audio).to_bytes(8, "little"))
+            hasher.update(ref.audio)
+            hasher.update(ref.text.encode())
+        hasher.update(len(reference_signature).to_bytes(8, "little"))
+        hasher.update(reference_signature)
+        return hasher.digest()
+
+    def _spawn(self, coro: Coroutine) -> asyncio.Task:
+        """创建后台协程并登记，任务被清理出任务表后也不会被回收"""
+        future = asyncio.create_task(coro)
+        self._running.add(future)
+        future.add_done_callback(self._running.discard)
+        return future
+
+    def _mark_running(self, task: AsyncTask) -> None:
+        """将等待中的任务标记为处理中"""
+        if task.status == TaskStatus.PENDING:
+            task.started_at = time.time()
+            task.started_mono = time.monotonic_ns()
+            task.status = TaskStatus.RUNNING
+
+    async def start_task(
         self, 
         task: AsyncTask, 
         engine: TTSInferenceEngine
     ) -> None:
         """
         启动任务执行
+
+        任务被提交到有界的推理线程池，超出并发上限的任务保持PENDING状态排队，
+        不会额外创建线程。与尚未完成的相同推理请求合并，只推理一次，
+        结果分发给各个任务分别编码保存。
         
         Args:
             task: 异步任务
             engine: TTS推理引擎
         """
-        def run_task():
-            try:
-                task.status = TaskStatus.RUNNING
-                task.started_at = time.time()
-                
-                # 检查是否已取消
-                if task.cancelled.is_set():
-                    task.status = TaskStatus.CANCELLED
-                    return
-                
-                # 执行推理
-                # 对于非流式请求，inference_wrapper会返回多个segment（bytes）和一个final（numpy数组）
-                # 我们需要等待final结果，它包含了所有合并后的音频数据
-                audio_data = None
-                sample_rate = engine.decoder_model.sample_rate
-                
-                for result in inference(task.request, engine):
-                    # 检查是否已取消
-                    if task.cancelled.is_set():
-                        task.status = TaskStatus.CANCELLED
-                        # 清理临时文件
-                        if task.result_path and os.path.exists(task.result_path):
-                            try:
-                                os.unlink(task.result_path)
-                            except Exception as e:
-                                logger.warning(f"Failed to delete temp file: {e}")
-                        return
-                    
-                    # 收集音频数据
-                    # inference_wrapper对于segment返回bytes，对于final返回numpy数组
-                    # 对于非流式请求，我们应该等待final结果（numpy数组），它包含了所有合并后的音频
-                    if isinstance(result, np.ndarray):
-                        # Final数据，直接使用（这是合并后的完整音频）
-                        audio_data = result
-                        break  # 找到final结果后就可以退出了
-                    # 对于segment（bytes），我们忽略它们，因为final结果已经包含了所有数据
-                
-                if audio_data is None:
-                    raise ValueError("No audio generated")
-                
-                # 保存到临时文件
-                result_filename = f"{task.step_id}.{task.request.format}"
-                result_path = self.temp_dir / result_filename
-                
+        # 参考目录的签名需要访问文件系统，放到线程中计算
+        reference_signature = await asyncio.to_thread(
+            self._reference_signature, task.request.reference_id
+        )
+        key = self._inference_key(task.request, reference_signature)
+        result_key = key + task.request.format.encode()
+
+        # 命中结果缓存时直接复用已生成的文件，无需推理
+        if await self._complete_from_cache(task, result_key):
+            return
+
+        shared = self._inflight.get(key)
+        if shared is None or shared.cancelled.is_set():
+            shared = SharedInference(task.request)
+            self._inflight[key] = shared
+            shared.future = self._spawn(self._run_inference(key, shared, engine))
+        else:
+            logger.info("Task {} coalesced with an in-flight inference", task.step_id)
+
+        shared.tasks.append(task)
+        task.inference = shared
+        if shared.started:
+            self._mark_running(task)
+
+        # 推理 future 在创建协程时绑定，之后 shared.future 可能已被释放
+        task.future = self._spawn(
+            self._finish_task(task, shared, shared.future, engine, result_key)
+        )
+
+    async def _run_inference(
+        self, key: bytes, shared: SharedInference, engine: TTSInferenceEngine
+    ) -> Optional[np.ndarray]:
+        """执行共享推理，返回合并后的完整音频；全部任务取消时返回None"""
+        try:
+            async with self._sem:
+                # 排队期间被取消的推理无需占用推理线程
+                if shared.cancelled.is_set():
+                    return None
+
+                shared.started = True
+                for task in shared.tasks:
+                    self._mark_running(task)
+
+                # 非流式请求只需要final结果（合并后的完整音频），
+                # inference_final 会跳过中间segment，不再逐段编码为bytes；
+                # 传入取消事件，使推理在解码步之间即可响应取消
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    self._executor,
+                    inference_final,
+                    shared.request,
+                    engine,
+                    shared.cancelled,
+                )
+        finally:
+            # 推理结束后，新的相同请求需要重新推理
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+
+    async def _finish_task(
+        self,
+        task: AsyncTask,
+        shared: SharedInference,
+        inference: asyncio.Task,
+        engine: TTSInferenceEngine,
+        result_key: bytes,
+    ) -> None:
+        """等待共享推理结果，并将音频编码保存为该任务的结果文件"""
+        try:
+            audio_data = await inference
+
+            # 检查是否已取消
+            if task.cancelled.is_set() or audio_data is None:
+                task.status = TaskStatus.CANCELLED
+                return
+
+            sample_rate = engine.decoder_model.sample_rate
+            loop = asyncio.get_running_loop()
+            result_path = await loop.run_in_executor(
+                self._encode_executor, self._save_result, task, audio_data, sample_rate
+            )
+            await loop.run_in_executor(
+                self._encode_executor, self._cache_result, result_key, result_path
+            )
+
+            task.result_path = result_path
+            task.completed_at = time.time()
+            task.completed_mono = time.monotonic_ns()
+            task.status = TaskStatus.COMPLETED
+
+            logger.info(
+                "Task {} completed in {:.2f}s",
+                task.step_id,
+                (task.completed_mono - task.started_mono) / 1e9,
+            )
+
+        except Exception as e:
+            # 取消导致的提前结束不视为失败
+            if task.cancelled.is_set():
+                task.completed_at = time.time()
+                task.completed_mono = time.monotonic_ns()
+                task.status = TaskStatus.CANCELLED
+                logger.info("Task {} cancelled during inference", task.step_id)
+                return
+            task.error_message = str(e)
+            task.completed_at = time.time()
+            task.completed_mono = time.monotonic_ns()
+            task.status = TaskStatus.FAILED
+            logger.exception("Task {} failed: {}", task.step_id, e)
+
+        finally:
+            # 任务结束后解除与共享推理的关联；所有合并的任务都处理完后释放
+            # 推理结果，避免保留的任务在过期前一直持有完整音频
+            task.inference = None
+            if task in shared.tasks:
+                shared.tasks.remove(task)
+            if not shared.tasks:
+                shared.future = None
+
+    def _save_result(
+        self, task: AsyncTask, audio_data: np.ndarray, sample_rate: int
+    ) -> Path:
+        """将音频按任务请求的格式编码并保存到临时目录，返回结果文件路径"""
+        # 保存到临时文件
+        result_path = self._result_path(task)
+
+        # 先写入 .part 临时文件，落盘后再原子替换，
+        # 避免取消或崩溃时留下写了一半的结果文件
+        part_path = result_path.with_suffix(result_path.suffix + ".part")
+        try:
+            with open(part_path, "wb", buffering=1 << 20) as f:
                 # 对于 MP3 格式，使用 pydub 设置比特率（至少 128kbps）
                 if task.request.format == "mp3":
-                    # 先将 numpy 数组转换为 AudioSegment
-                    # 需要先保存为 WAV 格式的临时文件，然后转换为 MP3
-                    temp_wav = io.BytesIO()
-                    sf.write(temp_wav, audio_data, sample_rate, format="wav")
-                    temp_wav.seek(0)
-                    
+                    # 直接用 16 位 PCM 数据构造 AudioSegment，
+                    # 无需先编码为内存中的 WAV 再解析回来
+                    audio_segment = AudioSegment(
+                        data=audio_to_int16(audio_data).tobytes(),
+                        sample_width=2,
+                        frame_rate=sample_rate,
+                        channels=1,
+                    )
+
                     # 使用 pydub 转换为 MP3，设置比特率为 192kbps
-                    audio_segment = AudioSegment.from_wav(temp_wav)
                     audio_segment.export(
-                        result_path,
+                        f,
                         format="mp3",
                         bitrate="192k"  # 设置为 192kbps，高于 128kbps 要求
                     )
+                elif task.request.format == "pcm":
+                    # 原始 PCM 没有文件头，直接写入 int16 采样数据
+                    f.write(audio_to_int16(audio_data).tobytes())
                 else:
-                    # 对于其他格式（WAV、FLAC），使用 soundfile
-                    buffer = io.BytesIO()
+                    # 对于 WAV 格式，使用 soundfile 直接写入文件，
+                    # 避免先编码到内存缓冲区再整体拷贝；
+                    # 先量化为 int16，soundfile 无需再做 float32 -> PCM_16 转换
                     sf.write(
-                        buffer,
-                        audio_data,
+                        f,
+                        audio_to_int16(audio_data),
                         sample_rate,
                         format=task.request.format,
+                        subtype="PCM_16",
                     )
-                    
-                    with open(result_path, "wb") as f:
-                        f.write(buffer.getvalue())
-                
-                task.result_path = str(result_path)
-                task.status = TaskStatus.COMPLETED
-                task.completed_at = time.time()
-                
-                logger.info(
-                    f"Task {task.step_id} completed in "
-                    f"{task.completed_at - task.started_at:.2f}s"
-                )
-                
-            except Exception as e:
-                task.status = TaskStatus.FAILED
-                task.error_message = str(e)
-                task.completed_at = time.time()
-                logger.error(f"Task {task.step_id} failed: {e}", exc_info=True)
-        
-        task.thread = threading.Thread(target=run_task, daemon=True)
-        task.thread.start()
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(part_path, result_path)
+        except BaseException:
+            part_path.unlink(missing_ok=True)
+            raise
+
+        return result_path
+
+    def _result_path(self, task: AsyncTask) -> Path:
+        """任务结果文件路径"""
+        return self.temp_dir / f"{task.step_id}.{task.request.format}"
+
+    @staticmethod
+    def _link_or_copy(src: Path, dst: Path) -> None:
+        """将 src 硬链接（不支持时复制）为 dst，并原子替换已有文件"""
+        part_path = dst.with_suffix(dst.suffix + ".part")
+        part_path.unlink(missing_ok=True)
+        try:
+            os.link(src, part_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # 文件系统不支持硬链接时退回复制
+            shutil.copyfile(src, part_path)
+        os.replace(part_path, dst)
+
+    def _cache_result(self, result_key: bytes, result_path: Path) -> None:
+        """将已完成的结果文件加入LRU缓存，淘汰的缓存文件在锁外删除"""
+        if self.result_cache_size <= 0:
+            return
+
+        cache_path = self._cache_dir / (result_key.hex() + result_path.suffix)
+        try:
+            self._link_or_copy(result_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache result {result_path}: {e}")
+            return
+
+        evicted: List[Path] = []
+        with self._result_cache_lock:
+            self._result_cache[result_key] = cache_path
+            self._result_cache.move_to_end(result_key)
+            while len(self._result_cache) > self.result_cache_size:
+                _, evicted_path = self._result_cache.popitem(last=False)
+                evicted.append(evicted_path)
+
+        for path in evicted:
+            path.unlink(missing_ok=True)
+
+    async def _complete_from_cache(self, task: AsyncTask, result_key: bytes) -> bool:
+        """尝试用缓存结果直接完成任务，返回是否命中"""
+        if self.result_cache_size <= 0:
+            return False
+
+        with self._result_cache_lock:
+            cache_path = self._result_cache.get(result_key)
+            if cache_path is None:
+                return False
+            self._result_cache.move_to_end(result_key)
+
+        result_path = self._result_path(task)
+        try:
+            await asyncio.to_thread(self._link_or_copy, cache_path, result_path)
+        except OSError as e:
+            # 缓存文件可能刚被淘汰，退回正常推理
+            logger.warning(f"Failed to reuse cached result for {task.step_id}: {e}")
+            return False
+
+        task.result_path = result_path
+        task.started_at = task.completed_at = time.time()
+        task.started_mono = task.completed_mono = time.monotonic_ns()
+        task.status = TaskStatus.COMPLETED
+        logger.info("Task {} completed from result cache", task.step_id)
+        return True
+
+    def _on_task_cancelled(self, task: AsyncTask) -> None:
+        """合并推理中的所有任务都已取消时，停止该推理"""
+        shared = task.inference
+        if shared is not None and all(t.cancelled.is_set() for t in shared.tasks):
+            shared.cancelled.set()
     
     def cancel_task(self, step_id: str) -> bool:
         """
@@ -234,14 +628,14 @@ class TaskManager:
         Returns:
             是否成功取消
         """
-        with self.lock:
-            task = self.tasks.get(step_id)
-            if task is None:
-                return False
-            
-            task.cancel()
-            logger.info(f"Task {step_id} cancelled")
-            return True
+        task = self.get_task(step_id)
+        if task is None:
+            return False
+
+        task.cancel()
+        self._on_task_cancelled(task)
+        logger.info("Task {} cancelled", step_id)
+        return True
     
     def cancel_all_tasks(self) -> int:
         """
@@ -251,45 +645,109 @@ class TaskManager:
             取消的任务数量
         """
         count = 0
-        with self.lock:
-            for task in self.tasks.values():
-                if task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
-                    task.cancel()
-                    count += 1
+        for task in self._iter_tasks():
+            if task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                task.cancel()
+                self._on_task_cancelled(task)
+                count += 1
         
         logger.info(f"Cancelled {count} tasks")
         return count
     
-    def cleanup_old_tasks(self, max_age_seconds: int = 3600):
+    def cleanup_old_tasks(self, max_age_seconds: int = TASK_MAX_AGE_SECONDS):
         """
         清理旧任务和临时文件
         
         Args:
             max_age_seconds: 最大保留时间（秒），默认1小时
         """
-        current_time = time.time()
+        cutoff = time.monotonic_ns() - max_age_seconds * 1_000_000_000
+
+        # 从堆顶弹出所有过期条目，复杂度 O(k log n)，k 为过期任务数
+        expired = []
+        with self._expiry_lock:
+            while self._expiry_heap and self._expiry_heap[0][0] < cutoff:
+                expired.append(heapq.heappop(self._expiry_heap))
+
+        # 从任务表中移除；被同名新任务覆盖的旧条目直接跳过，
+        # 仍在等待或运行中的任务保留，条目放回堆中下次再检查
         cleaned = 0
-        
-        with self.lock:
-            tasks_to_remove = []
-            for step_id, task in self.tasks.items():
-                age = current_time - task.created_at
-                if age > max_age_seconds:
-                    # 删除临时文件
-                    if task.result_path and os.path.exists(task.result_path):
-                        try:
-                            os.unlink(task.result_path)
-                        except Exception as e:
-                            logger.warning(f"Failed to delete temp file {task.result_path}: {e}")
-                    
-                    tasks_to_remove.append(step_id)
-                    cleaned += 1
-            
-            for step_id in tasks_to_remove:
-                del self.tasks[step_id]
-        
+        paths_to_remove: List[Path] = []
+        still_active: List[Tuple[int, str]] = []
+        for created_mono, step_id in expired:
+            index = self._shard_index(step_id)
+            shard = self._shards[index]
+            with self._locks[index]:
+                task = shard.get(step_id)
+                if task is None or task.created_mono != created_mono:
+                    continue
+                if task.status in (TaskStatus.PENDING, TaskStatus.RUNNING):
+                    still_active.append((created_mono, step_id))
+                    continue
+                del shard[step_id]
+            cleaned += 1
+            if task.result_path:
+                paths_to_remove.append(task.result_path)
+
+        if still_active:
+            with self._expiry_lock:
+                for entry in still_active:
+                    heapq.heappush(self._expiry_heap, entry)
+
+        # 在锁外删除临时文件
+        for path in paths_to_remove:
+            try:
+                path.unlink(missing_ok=True)
+            except Exception as e:
+                logger.warning(f"Failed to delete temp file {path}: {e}")
+
         if cleaned > 0:
             logger.info(f"Cleaned up {cleaned} old tasks")
+
+    def start_cleanup(
+        self,
+        interval_seconds: int = CLEANUP_INTERVAL_SECONDS,
+        max_age_seconds: int = TASK_MAX_AGE_SECONDS,
+    ) -> None:
+        """
+        启动后台定期清理任务，需在事件循环中调用
+        
+        Args:
+            interval_seconds: 清理间隔（秒）
+            max_age_seconds: 最大保留时间（秒）
+        """
+        if self._gc_task is not None:
+            return
+
+        async def gc_loop():
+            while True:
+                await asyncio.sleep(interval_seconds)
+                try:
+                    # 文件删除是阻塞操作，放到线程中执行，避免阻塞事件循环
+                    await asyncio.to_thread(self.cleanup_old_tasks, max_age_seconds)
+                except Exception:
+                    logger.exception("Failed to clean up old tasks")
+
+        self._gc_task = asyncio.create_task(gc_loop())
+
+    async def shutdown(self) -> None:
+        """
+        关闭任务管理器：停止后台清理，等待所有未完成的任务结束后释放线程池，
+        避免服务退出时丢失任务或留下写了一半的文件
+        """
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            await asyncio.gather(self._gc_task, return_exceptions=True)
+            self._gc_task = None
+
+        pending = list(self._running)
+        if pending:
+            logger.info(f"Waiting for {len(pending)} async task(s) to finish")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        self._executor.shutdown(wait=True)
+        self._encode_executor.shutdown(wait=True)
+        logger.info("TaskManager shut down")
     
     def get_task_info(self, step_id: str) -> Optional[dict]:
         """
@@ -304,20 +762,59 @@ class TaskManager:
         task = self.get_task(step_id)
         if task is None:
             return None
-        
+
+        return self._task_info(task)
+
+    def _task_info(self, task: AsyncTask) -> dict:
         info = {
             "step_id": task.step_id,
-            "status": task.status.value,
+            "status": task.status_value,
             "created_at": task.created_at,
             "started_at": task.started_at,
             "completed_at": task.completed_at,
         }
         
         if task.status == TaskStatus.COMPLETED and task.result_path:
-            info["download_url"] = f"/download_result/{task.step_id}"
+            info["download_url"] = DOWNLOAD_URL_PREFIX + task.step_id
         
         if task.status == TaskStatus.FAILED:
             info["error"] = task.error_message
         
         return info
 
+    def get_status_snapshot(self, step_id: str, as_json: bool) -> Optional[bytes]:
+        """
+        获取预序列化的任务状态响应（与 TaskStatusResponse 字段一致）
+
+        快照在首次查询时生成，任务状态变化时作废，轮询无需重复构造和序列化响应对象。
+
+        Args:
+            step_id: 任务ID
+            as_json: True 返回 JSON，False 返回 msgpack
+
+        Returns:
+            序列化后的响应体，如果任务不存在则返回None
+        """
+        task = self.get_task(step_id)
+        if task is None:
+            return None
+
+        snapshot = task.status_snapshot
+        if snapshot is None:
+            info = self._task_info(task)
+            body = {
+                "success": True,
+                "step_id": info["step_id"],
+                "status": info["status"],
+                "created_at": info["created_at"],
+                "started_at": info["started_at"],
+                "completed_at": info["completed_at"],
+                "download_url": info.get("download_url"),
+                "error": info.get("error"),
+            }
+            snapshot = task.status_snapshot = (
+                to_json(body),
+                ormsgpack.packb(body),
+            )
+
+        return snapshot[0] if as_json else snapshot[1]
@@ -1,22 +1,24 @@
+import asyncio
+import errno
 import io
 import os
-import re
 import shutil
-import tempfile
+import stat
 import time
+from collections import OrderedDict
+from contextvars import ContextVar
 from http import HTTPStatus
 from pathlib import Path
 
 import numpy as np
 import ormsgpack
-import soundfile as sf
 import torch
 from pydub import AudioSegment
 from kui.asgi import (
     Body,
+    FileResponse,
     HTTPException,
     HttpView,
-    JSONResponse,
     Routes,
     StreamResponse,
     UploadFile,
@@ -25,6 +27,7 @@ from kui.asgi import (
 from loguru import logger
 from typing_extensions import Annotated
 
+from fish_speech.inference_engine.reference_loader import REFERENCE_ID_RE
 from fish_speech.utils.schema import (
     AddReferenceRequest,
     AddReferenceResponse,
@@ -34,9 +37,7 @@ from fish_speech.utils.schema import (
     ListReferencesResponse,
     ServeTTSRequest,
     ServeVQGANDecodeRequest,
-    ServeVQGANDecodeResponse,
     ServeVQGANEncodeRequest,
-    ServeVQGANEncodeResponse,
     StopTaskResponse,
     TaskStatusResponse,
     UpdateReferenceResponse,
@@ -46,8 +47,11 @@ from tools.server.api_utils import (
     format_response,
     get_content_type,
     inference_async,
+    packb_bin_list,
+    wants_json,
+    wav_to_async_generator,
 )
-from tools.server.inference import inference_wrapper as inference
+from tools.server.inference import audio_to_int16, inference_final
 from tools.server.model_manager import ModelManager
 from tools.server.model_utils import (
     batch_vqgan_decode,
@@ -57,18 +61,70 @@ from tools.server.task_manager import TaskManager, TaskStatus
 
 MAX_NUM_SAMPLES = int(os.getenv("NUM_SAMPLES", 1))
 
+# Bound per request by the API middleware, so handlers skip the
+# request.app.state attribute chain
+model_manager_var: ContextVar[ModelManager] = ContextVar("model_manager")
+task_manager_var: ContextVar[TaskManager] = ContextVar("task_manager")
+
+
+def _is_blank(s: str | None) -> bool:
+    # isspace() scans in place, unlike strip() which allocates a new string
+    return not s or s.isspace()
+
+
+def _invalid_id(s: str | None) -> bool:
+    return _is_blank(s) or not REFERENCE_ID_RE.match(s)
+
+
+# 下载结果的内存 LRU 缓存：(路径, mtime_ns, 大小) -> 文件内容，0 表示禁用
+DOWNLOAD_CACHE_BYTES = int(os.getenv("DOWNLOAD_CACHE_BYTES", 0))
+_download_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+_download_cache_size = 0
+
+
+def _read_file(path: Path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _cached_download(path: Path, stat_result: os.stat_result) -> bytes:
+    """从缓存读取结果文件，未命中时在线程中读取并按总字节数淘汰旧条目"""
+    global _download_cache_size
+
+    key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+    blob = _download_cache.get(key)
+    if blob is not None:
+        _download_cache.move_to_end(key)
+        return blob
+
+    blob = await asyncio.to_thread(_read_file, path)
+    if len(blob) <= DOWNLOAD_CACHE_BYTES and key not in _download_cache:
+        _download_cache[key] = blob
+        _download_cache_size += len(blob)
+        while _download_cache_size > DOWNLOAD_CACHE_BYTES:
+            _, evicted = _download_cache.popitem(last=False)
+            _download_cache_size -= len(evicted)
+    return blob
+
+
 routes = Routes()
 
 
+# Health probes fire constantly; serve pre-encoded bytes instead of
+# serializing a dict per call. A fresh response wraps them each time, since
+# response objects are not safe to reuse across requests.
+_HEALTH_OK = (b'{"status":"ok"}', 200, {"Content-Type": "application/json"})
+
+
 @routes.http("/v1/health")
 class Health(HttpView):
     @classmethod
     async def get(cls):
-        return JSONResponse({"status": "ok"})
+        return _HEALTH_OK
 
     @classmethod
     async def post(cls):
-        return JSONResponse({"status": "ok"})
+        return _HEALTH_OK
 
 
 @routes.http.post("/v1/vqgan/encode")
@@ -78,20 +134,28 @@ async def vqgan_encode(req: Annotated[ServeVQGANEncodeRequest, Body(exclusive=Tr
     """
     try:
         # Get the model from the app
-        model_manager: ModelManager = request.app.state.model_manager
+        model_manager = model_manager_var.get()
         decoder_model = model_manager.decoder_model
 
         # Encode the audio
-        start_time = time.time()
+        start_time = time.perf_counter()
         tokens = cached_vqgan_batch_encode(decoder_model, req.audios)
         logger.info(
-            f"[EXEC] VQGAN encode time: {(time.time() - start_time) * 1000:.2f}ms"
+            f"[EXEC] VQGAN encode time: {(time.perf_counter() - start_time) * 1000:.2f}ms"
         )
 
-        # Return the response
+        # Pack the codes as raw int16 buffers (codebook ids fit) instead of
+        # nested lists of Python ints
+        tokens = [np.ascontiguousarray(i.numpy(), dtype="<i2") for i in tokens]
+
+        # Return the response, packed as a plain dict matching
+        # ServeVQGANEncodeResponse to skip the Pydantic field walk
         return ormsgpack.packb(
-            ServeVQGANEncodeResponse(tokens=[i.tolist() for i in tokens]),
-            option=ormsgpack.OPT_SERIALIZE_PYDANTIC,
+            {
+                "tokens": [i.tobytes() for i in tokens],
+                "shapes": [list(i.shape) for i in tokens],
+                "dtype": "int16",
+            }
         )
     except Exception as e:
         logger.error(f"Error in VQGAN encode: {e}", exc_info=True)
@@ -107,22 +171,36 @@ async def vqgan_decode(req: Annotated[ServeVQGANDecodeRequest, Body(exclusive=Tr
     """
     try:
         # Get the model from the app
-        model_manager: ModelManager = request.app.state.model_manager
+        model_manager = model_manager_var.get()
         decoder_model = model_manager.decoder_model
 
         # Decode the audio
-        tokens = [torch.tensor(token, dtype=torch.int) for token in req.tokens]
-        start_time = time.time()
-        audios = batch_vqgan_decode(decoder_model, tokens)
+        if req.shapes is not None:
+            tokens = [
+                torch.from_numpy(
+                    np.frombuffer(token, dtype=req.dtype)
+                    .reshape(shape)
+                    .astype(np.int32)
+                )
+                for token, shape in zip(req.tokens, req.shapes, strict=True)
+            ]
+        else:
+            tokens = [
+                torch.from_numpy(np.asarray(token, dtype=np.int32))
+                for token in req.tokens
+            ]
+        start_time = time.perf_counter()
+        audios = batch_vqgan_decode(
+            decoder_model, tokens, dtype=torch.float16, pinned=True
+        )
         logger.info(
-            f"[EXEC] VQGAN decode time: {(time.time() - start_time) * 1000:.2f}ms"
+            f"[EXEC] VQGAN decode time: {(time.perf_counter() - start_time) * 1000:.2f}ms"
         )
-        audios = [audio.astype(np.float16).tobytes() for audio in audios]
-
-        # Return the response
-        return ormsgpack.packb(
-            ServeVQGANDecodeResponse(audios=audios),
-            option=ormsgpack.OPT_SERIALIZE_PYDANTIC,
+        # Return the response, packed as ServeVQGANDecodeResponse directly
+        # from the decoded host arrays (copied out of the shared staging
+        # buffer here, before the handler yields to the event loop)
+        return packb_bin_list(
+            "audios", [np.ascontiguousarray(audio) for audio in audios]
         )
     except Exception as e:
         logger.error(f"Error in VQGAN decode: {e}", exc_info=True)
@@ -139,7 +217,7 @@ async def tts(req: Annotated[ServeTTSRequest, Body(exclusive=True)]):
     try:
         # Get the model from the app
         app_state = request.app.state
-        model_manager: ModelManager = app_state.model_manager
+        model_manager = model_manager_var.get()
         engine = model_manager.tts_inference_engine
         sample_rate = engine.decoder_model.sample_rate
 
@@ -167,34 +245,51 @@ async def tts(req: Annotated[ServeTTSRequest, Body(exclusive=True)]):
                 content_type=get_content_type(req.format),
             )
         else:
-            fake_audios = next(inference(req, engine))
-            
-            # 对于 MP3 格式，使用 pydub 设置比特率（至少 128kbps）
-            if req.format == "mp3":
-                # 先将 numpy 数组保存为 WAV 格式的临时文件
-                temp_wav = io.BytesIO()
-                sf.write(temp_wav, fake_audios, sample_rate, format="wav")
-                temp_wav.seek(0)
-                
-                # 使用 pydub 转换为 MP3，设置比特率为 192kbps
-                audio_segment = AudioSegment.from_wav(temp_wav)
-                buffer = io.BytesIO()
-                audio_segment.export(
-                    buffer,
-                    format="mp3",
-                    bitrate="192k"  # 设置为 192kbps，高于 128kbps 要求
+            fake_audios = inference_final(req, engine)
+            pcm = audio_to_int16(fake_audios)
+
+            # WAV is raw PCM behind a fixed header, so stream it straight from
+            # the sample buffer instead of encoding a full copy first
+            if req.format == "wav":
+                return StreamResponse(
+                    iterable=wav_to_async_generator(pcm, sample_rate),
+                    headers={
+                        "Content-Disposition": "attachment; filename=audio.wav",
+                        "Content-Length": str(44 + pcm.nbytes),
+                    },
+                    content_type=get_content_type(req.format),
                 )
-                buffer.seek(0)
-            else:
-                # 对于其他格式（WAV、FLAC），使用 soundfile
-                buffer = io.BytesIO()
-                sf.write(
-                    buffer,
-                    fake_audios,
-                    sample_rate,
-                    format=req.format,
+
+            # Raw PCM has no container at all, stream the samples as they are
+            if req.format == "pcm":
+                return StreamResponse(
+                    iterable=buffer_to_async_generator(pcm),
+                    headers={
+                        "Content-Disposition": "attachment; filename=audio.pcm",
+                        "Content-Length": str(pcm.nbytes),
+                    },
+                    content_type=get_content_type(req.format),
                 )
 
+            # 对于 MP3 格式，使用 pydub 设置比特率（至少 128kbps）
+            # 直接用 PCM 数据构造 AudioSegment，无需先编码为 WAV
+            audio_segment = AudioSegment(
+                data=pcm.tobytes(),
+                sample_width=2,
+                frame_rate=sample_rate,
+                channels=1,
+            )
+            # 使用 pydub 转换为 MP3，设置比特率为 192kbps
+            buffer = io.BytesIO()
+            audio_segment.export(
+                buffer,
+                format="mp3",
+                bitrate="192k",  # 设置为 192kbps，高于 128kbps 要求
+            )
+
+            # BytesIO.getvalue() hands back the internal bytes object without
+            # copying; ASGI requires bytes bodies, so a getbuffer() memoryview
+            # would have to be copied again anyway.
             return StreamResponse(
                 iterable=buffer_to_async_generator(buffer.getvalue()),
                 headers={
@@ -219,33 +314,22 @@ async def add_reference(
     """
     Add a new reference voice with audio file and text.
     """
-    temp_file_path = None
-
     try:
         # Validate input parameters
-        if not id or not id.strip():
+        if _is_blank(id):
             raise ValueError("Reference ID cannot be empty")
 
-        if not text or not text.strip():
+        if _is_blank(text):
             raise ValueError("Reference text cannot be empty")
 
         # Get the model manager to access the reference loader
-        app_state = request.app.state
-        model_manager: ModelManager = app_state.model_manager
+        model_manager = model_manager_var.get()
         engine = model_manager.tts_inference_engine
 
-        # Read the uploaded audio file
-        audio_content = audio.read()
-        if not audio_content:
-            raise ValueError("Audio file is empty or could not be read")
-
-        # Create a temporary file for the audio data
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_file:
-            temp_file.write(audio_content)
-            temp_file_path = temp_file.name
-
-        # Add the reference using the engine's reference loader
-        engine.add_reference(id, temp_file_path, text)
+        # Stream the upload straight into the reference directory in
+        # fixed-size chunks, without a temporary copy on disk
+        audio.seek(0)
+        await asyncio.to_thread(engine.add_reference_from_file, id, audio.file, text)
 
         response = AddReferenceResponse(
             success=True,
@@ -282,16 +366,6 @@ async def add_reference(
         )
         return format_response(response, status_code=500)
 
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except OSError as e:
-                logger.warning(
-                    f"Failed to clean up temporary file {temp_file_path}: {e}"
-                )
-
 
 @routes.http.get("/v1/references/list")
 async def list_references():
@@ -300,18 +374,18 @@ async def list_references():
     """
     try:
         # Get the model manager to access the reference loader
-        app_state = request.app.state
-        model_manager: ModelManager = app_state.model_manager
+        model_manager = model_manager_var.get()
         engine = model_manager.tts_inference_engine
 
         # Get the list of reference IDs
-        reference_ids = engine.list_reference_ids()
-
-        response = ListReferencesResponse(
-            success=True,
-            reference_ids=reference_ids,
-            message=f"Found {len(reference_ids)} reference voices",
-        )
+        reference_ids = await asyncio.to_thread(engine.list_reference_ids)
+
+        # Plain dict with the ListReferencesResponse fields
+        response = {
+            "success": True,
+            "reference_ids": reference_ids,
+            "message": f"Found {len(reference_ids)} reference voices",
+        }
         return format_response(response)
 
     except Exception as e:
@@ -329,16 +403,15 @@ async def delete_reference(reference_id: str = Body(...)):
     """
     try:
         # Validate input parameters
-        if not reference_id or not reference_id.strip():
+        if _is_blank(reference_id):
             raise ValueError("Reference ID cannot be empty")
 
         # Get the model manager to access the reference loader
-        app_state = request.app.state
-        model_manager: ModelManager = app_state.model_manager
+        model_manager = model_manager_var.get()
         engine = model_manager.tts_inference_engine
 
         # Delete the reference using the engine's reference loader
-        engine.delete_reference(reference_id)
+        await asyncio.to_thread(engine.delete_reference, reference_id)
 
         response = DeleteReferenceResponse(
             success=True,
@@ -384,6 +457,34 @@ async def delete_reference(reference_id: str = Body(...)):
         return format_response(response, status_code=500)
 
 
+def _rename_reference_dir(old_dir: Path, new_dir: Path) -> bool:
+    """
+    Rename a reference directory, returning False if the destination exists.
+    """
+    # Existence checks, one stat(2) per path
+    try:
+        old_is_dir = stat.S_ISDIR(os.stat(old_dir).st_mode)
+    except FileNotFoundError:
+        old_is_dir = False
+    if not old_is_dir:
+        raise FileNotFoundError(f"Reference ID '{old_dir.name}' not found")
+    try:
+        os.stat(new_dir)
+        return False
+    except FileNotFoundError:
+        pass
+
+    # Perform rename; fall back to copy + delete if references/ spans
+    # filesystems (e.g. a bind-mounted voice directory)
+    try:
+        os.rename(old_dir, new_dir)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(old_dir, new_dir)
+    return True
+
+
 @routes.http.post("/v1/references/update")
 async def update_reference(
     old_reference_id: str = Body(...), new_reference_id: str = Body(...)
@@ -393,33 +494,27 @@ async def update_reference(
     """
     try:
         # Validate input parameters
-        if not old_reference_id or not old_reference_id.strip():
+        if _is_blank(old_reference_id):
             raise ValueError("Old reference ID cannot be empty")
-        if not new_reference_id or not new_reference_id.strip():
-            raise ValueError("New reference ID cannot be empty")
-        if old_reference_id == new_reference_id:
-            raise ValueError("New reference ID must be different from old reference ID")
-
-        # Validate ID format per ReferenceLoader rules
-        id_pattern = r"^[a-zA-Z0-9\-_ ]+$"
-        if not re.match(id_pattern, new_reference_id) or len(new_reference_id) > 255:
+        # Emptiness and ID format per ReferenceLoader rules in one check
+        if _invalid_id(new_reference_id):
             raise ValueError(
-                "New reference ID contains invalid characters or is too long"
+                "New reference ID is empty, contains invalid characters or is too long"
             )
+        if old_reference_id == new_reference_id:
+            raise ValueError("New reference ID must be different from old reference ID")
 
         # Access engine to update caches after renaming
-        app_state = request.app.state
-        model_manager: ModelManager = app_state.model_manager
+        model_manager = model_manager_var.get()
         engine = model_manager.tts_inference_engine
 
         refs_base = Path("references")
         old_dir = refs_base / old_reference_id
         new_dir = refs_base / new_reference_id
 
-        # Existence checks
-        if not old_dir.exists() or not old_dir.is_dir():
-            raise FileNotFoundError(f"Reference ID '{old_reference_id}' not found")
-        if new_dir.exists():
+        # Check and rename off the event loop, references/ may be slow storage
+        renamed = await asyncio.to_thread(_rename_reference_dir, old_dir, new_dir)
+        if not renamed:
             # Conflict: destination already exists
             response = UpdateReferenceResponse(
                 success=False,
@@ -429,9 +524,6 @@ async def update_reference(
             )
             return format_response(response, status_code=409)
 
-        # Perform rename
-        old_dir.rename(new_dir)
-
         # Update in-memory cache key if present
         if old_reference_id in engine.ref_by_id:
             engine.ref_by_id[new_reference_id] = engine.ref_by_id.pop(old_reference_id)
@@ -498,8 +590,8 @@ async def generate_audio_enhanced_async(
     try:
         # 获取模型管理器和任务管理器
         app_state = request.app.state
-        model_manager: ModelManager = app_state.model_manager
-        task_manager: TaskManager = app_state.task_manager
+        model_manager = model_manager_var.get()
+        task_manager = task_manager_var.get()
         engine = model_manager.tts_inference_engine
 
         # 检查文本长度
@@ -542,7 +634,7 @@ async def generate_audio_enhanced_async(
             return format_response(response, status_code=400)
 
         # 启动任务
-        task_manager.start_task(task, engine)
+        await task_manager.start_task(task, engine)
 
         response = AsyncGenerateResponse(
             success=True,
@@ -584,11 +676,11 @@ async def get_task_status():
             )
             return format_response(response, status_code=400)
         
-        app_state = request.app.state
-        task_manager: TaskManager = app_state.task_manager
+        task_manager = task_manager_var.get()
 
-        task_info = task_manager.get_task_info(step_id)
-        if task_info is None:
+        as_json = wants_json(request)
+        snapshot = task_manager.get_status_snapshot(step_id, as_json)
+        if snapshot is None:
             response = TaskStatusResponse(
                 success=False,
                 step_id=step_id,
@@ -597,17 +689,9 @@ async def get_task_status():
             )
             return format_response(response, status_code=404)
 
-        response = TaskStatusResponse(
-            success=True,
-            step_id=task_info["step_id"],
-            status=task_info["status"],
-            created_at=task_info["created_at"],
-            started_at=task_info.get("started_at"),
-            completed_at=task_info.get("completed_at"),
-            download_url=task_info.get("download_url"),
-            error=task_info.get("error"),
-        )
-        return format_response(response)
+        # 轮询热路径：直接返回状态变化时才重新生成的序列化快照
+        content_type = "application/json" if as_json else "application/msgpack"
+        return snapshot, 200, {"Content-Type": content_type}
 
     except Exception as e:
         logger.error(f"Error getting task status: {e}", exc_info=True)
@@ -638,8 +722,7 @@ async def download_result():
                 content="step_id query parameter is required",
             )
         
-        app_state = request.app.state
-        task_manager: TaskManager = app_state.task_manager
+        task_manager = task_manager_var.get()
 
         task = task_manager.get_task(step_id)
         if task is None:
@@ -654,26 +737,39 @@ async def download_result():
                 content=f"Task {step_id} is not completed, current status: {task.status.value}",
             )
 
-        if not task.result_path or not os.path.exists(task.result_path):
+        try:
+            stat_result = os.stat(task.result_path) if task.result_path else None
+        except FileNotFoundError:
+            stat_result = None
+        if stat_result is None:
             raise HTTPException(
                 HTTPStatus.NOT_FOUND,
                 content=f"Result file for task {step_id} not found",
             )
 
-        # 读取文件并返回
-        with open(task.result_path, "rb") as f:
-            file_content = f.read()
-
         # 获取文件格式
         file_format = task.request.format
         filename = f"audio_{step_id}.{file_format}"
 
-        return StreamResponse(
-            iterable=buffer_to_async_generator(file_content),
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-            },
+        # 启用缓存时，完整下载直接返回内存中的内容；Range 请求仍交给 FileResponse
+        if DOWNLOAD_CACHE_BYTES > 0 and "range" not in request.headers:
+            blob = await _cached_download(task.result_path, stat_result)
+            return (
+                blob,
+                200,
+                {
+                    "Content-Type": get_content_type(file_format),
+                    "Content-Disposition": f'attachment; filename="{filename}"',
+                },
+            )
+
+        # FileResponse 在线程池中分块读取（服务器支持时使用 zerocopysend），
+        # 并自动设置 Content-Length 和 Range 支持
+        return FileResponse(
+            str(task.result_path),
             content_type=get_content_type(file_format),
+            download_name=filename,
+            stat_result=stat_result,
         )
 
     except HTTPException:
@@ -692,8 +788,7 @@ async def stop_generation():
     停止所有正在运行的生成任务。
     """
     try:
-        app_state = request.app.state
-        task_manager: TaskManager = app_state.task_manager
+        task_manager = task_manager_var.get()
 
         count = task_manager.cancel_all_tasks()
 
@@ -718,8 +813,7 @@ async def stop_async_task(step_id: str):
     停止指定的异步任务。
     """
     try:
-        app_state = request.app.state
-        task_manager: TaskManager = app_state.task_manager
+        task_manager = task_manager_var.get()
 
         success = task_manager.cancel_task(step_id)
         if not success: